@@ -0,0 +1,202 @@
+import asyncio
+import collections
+import json
+import math
+import threading
+import time
+
+# READING KEY -> PROMETHEUS METRIC
+METRICS = (
+    ('tempC', 'weather_temperature_celsius', 'Air temperature in degrees Celsius'),
+    ('hum', 'weather_humidity_percent', 'Relative humidity in percent'),
+    ('pressure', 'weather_pressure_kilopascals', 'Barometric pressure in kPa'),
+    ('lux', 'weather_illuminance_lux', 'Illuminance in lux'),
+)
+
+HISTORY_SIZE = 720
+MAX_HEADER_BYTES = 8192
+
+
+def _finite_only(stations):
+    """ Failed reads (nan, inf) become None, served as null in json and left out of /metrics """
+    cleaned = {}
+    for station, readings in stations.items():
+        cleaned[station] = dict(
+            (key, None if isinstance(value, float) and not math.isfinite(value) else value)
+            for key, value in readings.items())
+    return cleaned
+
+
+class SnapshotCache(object):
+    """
+    Latest readings and recent history, rendered once per update.
+
+    Requests only ever read the rendered bodies, they never touch a sensor.
+    """
+
+    def __init__(self, history_size=HISTORY_SIZE):
+        """
+        :type history_size: int specifying how many updates /history keeps
+        """
+        self._lock = threading.Lock()
+        self._history = collections.deque(maxlen=history_size)
+        self._bodies = self._render(None)
+
+    def update(self, stations, timestamp=None):
+        """
+        :type stations: dict of station name -> dict of readings (tempC, tempF, hum, pressure, lux)
+        :type timestamp: float seconds since epoch, defaults to now
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        snapshot = {'timestamp': timestamp, 'stations': _finite_only(stations)}
+
+        with self._lock:
+            self._history.append(snapshot)
+            bodies = self._render(snapshot)
+            # a single reference swap, readers never see a half built set
+            self._bodies = bodies
+
+    def body(self, path):
+        return self._bodies.get(path)
+
+    def _render(self, snapshot):
+        latest = snapshot if snapshot is not None else {'timestamp': None, 'stations': {}}
+        history = list(self._history)
+        return {
+            '/readings': ('application/json', json.dumps(latest, sort_keys=True, allow_nan=False).encode('utf-8')),
+            '/history': ('application/json', json.dumps(history, sort_keys=True, allow_nan=False).encode('utf-8')),
+            '/metrics': ('text/plain; version=0.0.4', self._render_prometheus(snapshot).encode('utf-8')),
+        }
+
+    @staticmethod
+    def _render_prometheus(snapshot):
+        lines = []
+        if snapshot is None:
+            return ''
+
+        for key, metric, description in METRICS:
+            samples = []
+            for station, readings in sorted(snapshot['stations'].items()):
+                value = readings.get(key)
+                if value is None:
+                    continue
+                samples.append('{0}{{station="{1}"}} {2!r}'.format(
+                    metric, station.replace('\\', '\\\\').replace('"', '\\"'), float(value)))
+            if samples:
+                lines.append('# HELP {0} {1}'.format(metric, description))
+                lines.append('# TYPE {0} gauge'.format(metric))
+                lines.extend(samples)
+
+        lines.append('# HELP weather_last_update_timestamp_seconds Time of the last sensor update')
+        lines.append('# TYPE weather_last_update_timestamp_seconds gauge')
+        lines.append('weather_last_update_timestamp_seconds {0!r}'.format(float(snapshot['timestamp'])))
+        return '\n'.join(lines) + '\n'
+
+
+class HttpExporter(object):
+    """ Serves a SnapshotCache over HTTP from an asyncio loop on its own thread """
+
+    def __init__(self, cache, host='127.0.0.1', port=8080):
+        """
+        :type cache: SnapshotCache to serve
+        :type host: string specifying the address to bind
+        :type port: int specifying the port to bind
+        """
+        self.cache = cache
+        self.host = host
+        self.port = port
+        self._loop = None
+        self._thread = None
+        self._started = threading.Event()
+        self._error = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='http-exporter')
+        self._thread.daemon = True
+        self._thread.start()
+        self._started.wait()
+        if self._error is not None:
+            raise self._error
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(1)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port))
+        except OSError as err:
+            self._error = err
+            self._started.set()
+            return
+
+        # resolves port 0 to the port the OS picked
+        self.port = server.sockets[0].getsockname()[1]
+        self._started.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            server.close()
+            self._loop.run_until_complete(server.wait_closed())
+            self._loop.close()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                if len(head) > MAX_HEADER_BYTES:
+                    return
+
+                lines = head.decode('latin-1').split('\r\n')
+                parts = lines[0].split()
+                if len(parts) != 3:
+                    writer.write(self._response(400, 'text/plain', b'bad request\n', False))
+                    return
+                method, target, version = parts
+                headers = dict(
+                    (name.strip().lower(), value.strip())
+                    for name, _sep, value in (line.partition(':') for line in lines[1:] if line))
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+                # bodies are never read, close rather than parse one as the next request
+                if method not in ('GET', 'HEAD') or 'content-length' in headers or 'transfer-encoding' in headers:
+                    keep_alive = False
+
+                path = target.split('?', 1)[0]
+                if path == '/':
+                    path = '/readings'
+                body = self.cache.body(path)
+
+                if method not in ('GET', 'HEAD'):
+                    writer.write(self._response(405, 'text/plain', b'method not allowed\n', keep_alive))
+                elif body is None:
+                    writer.write(self._response(404, 'text/plain', b'not found\n', keep_alive))
+                else:
+                    content_type, payload = body
+                    writer.write(self._response(200, content_type, payload, keep_alive, method == 'HEAD'))
+
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _response(status, content_type, payload, keep_alive, head_only=False):
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+        head = 'HTTP/1.1 {0} {1}\r\nContent-Type: {2}\r\nContent-Length: {3}\r\nConnection: {4}\r\n\r\n'.format(
+            status, reasons[status], content_type, len(payload), 'keep-alive' if keep_alive else 'close')
+        if head_only:
+            return head.encode('latin-1')
+        return head.encode('latin-1') + payload
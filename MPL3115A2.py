@@ -1,6 +1,8 @@
 import numpy as np
 from smbus import SMBus
 from sys import exit
+from RawCapture import RAW_MPL3115A2_PRESSURE, RAW_MPL3115A2_ALTITUDE, RAW_MPL3115A2_TEMPERATURE, \
+    RAW_MPL3115A2_BAR_IN, select
 
 # I2C ADDRESS / BITS
 MPL3115A2_ADDRESS = 0x60
@@ -28,6 +30,7 @@ MPL3115A2_OUT_T_DELTA_MSB = 0x0A
 MPL3115A2_OUT_T_DELTA_LSB = 0x0B
 
 MPL3115A2_BAR_IN_MSB = 0x14
+MPL3115A2_BAR_IN_DEFAULT = 101326.  # Pa, value after reset
 
 MPL3115A2_WHOAMI = 0x0C
 
@@ -62,13 +65,19 @@ MPL3115A2_REGISTER_STARTCONVERSION = 0x12
 
 class Mpl3115a2(object):
     _bus = None
+    _address = MPL3115A2_ADDRESS
+    _capture = None
 
-    def __init__(self, i2c_bus=0):
+    def __init__(self, i2c_bus=0, sensor_address=MPL3115A2_ADDRESS, capture=None):
         """
         :type i2c_bus: int specifying i2c bus number
+        :type sensor_address: int specifying i2c address of the sensor
+        :type capture: RawCaptureLog receiving raw register reads, or None
         """
         self._bus = SMBus(i2c_bus)
-        whoami = self._bus.read_byte_data(MPL3115A2_ADDRESS, MPL3115A2_WHOAMI)
+        self._address = sensor_address
+        self._capture = capture
+        whoami = self._bus.read_byte_data(self._address, MPL3115A2_WHOAMI)
 
         if whoami != 0xc4:
             print("MPL3115A2 not active.")
@@ -76,7 +85,7 @@ class Mpl3115a2(object):
 
         # Set MPL3115A2 oversampling to 128, put in Barometer mode, enabled standby on CTRL_REG1
         self._bus.write_byte_data(
-            MPL3115A2_ADDRESS,
+            self._address,
             MPL3115A2_CTRL_REG1,
             MPL3115A2_CTRL_REG1_SBYB |
             MPL3115A2_CTRL_REG1_OS128 |
@@ -84,7 +93,7 @@ class Mpl3115a2(object):
 
         # Configure MPL3115A2
         self._bus.write_byte_data(
-            MPL3115A2_ADDRESS,
+            self._address,
             MPL3115A2_PT_DATA_CFG,
             MPL3115A2_PT_DATA_CFG_TDEFE |
             MPL3115A2_PT_DATA_CFG_PDEFE |
@@ -93,12 +102,12 @@ class Mpl3115a2(object):
     def poll(self):
         sta = 0
         while not (sta & MPL3115A2_REGISTER_STATUS_PDR):
-            sta = self._bus.read_byte_data(MPL3115A2_ADDRESS, MPL3115A2_REGISTER_STATUS)
+            sta = self._bus.read_byte_data(self._address, MPL3115A2_REGISTER_STATUS)
 
     def get_altitude(self):
         # print "Reading Altitude Data..."
         self._bus.write_byte_data(
-            MPL3115A2_ADDRESS,
+            self._address,
             MPL3115A2_CTRL_REG1,
             MPL3115A2_CTRL_REG1_SBYB |
             MPL3115A2_CTRL_REG1_OS128 |
@@ -106,8 +115,13 @@ class Mpl3115a2(object):
 
         self.poll()
 
-        msb, csb, lsb = self._bus.read_i2c_block_data(MPL3115A2_ADDRESS, MPL3115A2_REGISTER_PRESSURE_MSB, 3)
+        msb, csb, lsb = self._bus.read_i2c_block_data(self._address, MPL3115A2_REGISTER_PRESSURE_MSB, 3)
         # print msb, csb, lsb
+        if self._capture is not None:
+            self._capture.record(
+                RAW_MPL3115A2_ALTITUDE,
+                MPL3115A2_CTRL_REG1_SBYB | MPL3115A2_CTRL_REG1_OS128 | MPL3115A2_CTRL_REG1_ALT,
+                [msb, csb, lsb, 0, 0, 0])
 
         alt = float((((msb << 24) | (csb << 16) | lsb) * 10) / 65536)
 
@@ -120,7 +134,7 @@ class Mpl3115a2(object):
     def get_pressure(self):
         # print "Reading Pressure Data..."
         self._bus.write_byte_data(
-            MPL3115A2_ADDRESS,
+            self._address,
             MPL3115A2_CTRL_REG1,
             MPL3115A2_CTRL_REG1_SBYB |
             MPL3115A2_CTRL_REG1_OS128 |
@@ -128,8 +142,13 @@ class Mpl3115a2(object):
 
         self.poll()
 
-        msb, csb, lsb = self._bus.read_i2c_block_data(MPL3115A2_ADDRESS, MPL3115A2_REGISTER_PRESSURE_MSB, 3)
+        msb, csb, lsb = self._bus.read_i2c_block_data(self._address, MPL3115A2_REGISTER_PRESSURE_MSB, 3)
         # print msb, csb, lsb
+        if self._capture is not None:
+            self._capture.record(
+                RAW_MPL3115A2_PRESSURE,
+                MPL3115A2_CTRL_REG1_SBYB | MPL3115A2_CTRL_REG1_OS128 | MPL3115A2_CTRL_REG1_BAR,
+                [msb, csb, lsb, 0, 0, 0])
 
         return ((msb << 16) | (csb << 8) | lsb) / 64.
 
@@ -150,7 +169,9 @@ class Mpl3115a2(object):
         ta = (t / 10)
         aa = (a / 10)
 
-        self._bus.write_i2c_block_data(MPL3115A2_ADDRESS, MPL3115A2_BAR_IN_MSB, [pa >> 8 & 0xff, pa & 0xff])
+        self._bus.write_i2c_block_data(self._address, MPL3115A2_BAR_IN_MSB, [pa >> 8 & 0xff, pa & 0xff])
+        if self._capture is not None:
+            self._capture.record(RAW_MPL3115A2_BAR_IN, 0, [pa >> 8 & 0xff, pa & 0xff, 0, 0, 0, 0])
 
         return [pa, ta, aa]
 
@@ -158,7 +179,7 @@ class Mpl3115a2(object):
         # print "Reading Temperature Data..."
 
         self._bus.write_byte_data(
-            MPL3115A2_ADDRESS,
+            self._address,
             MPL3115A2_CTRL_REG1,
             MPL3115A2_CTRL_REG1_SBYB |
             MPL3115A2_CTRL_REG1_OS128 |
@@ -166,9 +187,82 @@ class Mpl3115a2(object):
 
         self.poll()
 
-        t_data = self._bus.read_i2c_block_data(MPL3115A2_ADDRESS, MPL3115A2_REGISTER_STATUS_PDR, 2)
+        t_data = self._bus.read_i2c_block_data(self._address, MPL3115A2_REGISTER_STATUS_PDR, 2)
         # status = _bus.read_byte_data(MPL3115A2_ADDRESS, 0x00)
 
         # print t_data
+        if self._capture is not None:
+            self._capture.record(
+                RAW_MPL3115A2_TEMPERATURE,
+                MPL3115A2_CTRL_REG1_SBYB | MPL3115A2_CTRL_REG1_OS128 | MPL3115A2_CTRL_REG1_BAR,
+                [t_data[0], t_data[1], 0, 0, 0, 0])
 
         return t_data[0] + (t_data[1] >> 4) / 16.0
+
+
+def _out_p(records):
+    data = records['data'].astype(np.int64)
+    return (data[:, 0], data[:, 1], data[:, 2])
+
+
+def pressure_batch(msb, csb, lsb):
+    """ Vectorized Mpl3115a2.get_pressure, Pa """
+    return ((msb << 16) | (csb << 8) | lsb) / 64.
+
+
+def altitude_batch(msb, csb, lsb):
+    """ Vectorized Mpl3115a2.get_altitude """
+    alt = (((msb << 24) | (csb << 16) | lsb) * 10) / 65536.
+
+    # correct sign
+    return np.where(alt > (1 << 15), alt - (1 << 16), alt)
+
+
+def pressure_to_altitude_batch(pressure, sea_level_pressure=MPL3115A2_BAR_IN_DEFAULT):
+    """ Altitude in meters from pressure in Pa, same model the sensor applies with BAR_IN """
+    return 44330.77 * (1 - np.power(np.asarray(pressure, dtype=np.float64) / sea_level_pressure, 0.1902632))
+
+
+def temperature_batch(msb, lsb):
+    """ Vectorized Mpl3115a2.get_temperature """
+    return msb + (lsb >> 4) / 16.0
+
+
+def sea_level_pressure_at(timestamps, bar_in_timestamps, bar_in):
+    """ Sea level pressure in Pa from the last BAR_IN written before each timestamp """
+    order = np.argsort(bar_in_timestamps, kind='stable')
+    bar_in_timestamps = np.asarray(bar_in_timestamps)[order]
+    # BAR_IN is in 2 Pa units, samples before any calibration use the reset value
+    sea_level = np.concatenate(([MPL3115A2_BAR_IN_DEFAULT], np.asarray(bar_in, dtype=np.float64)[order] * 2))
+    return sea_level[np.searchsorted(bar_in_timestamps, timestamps, side='right')]
+
+
+def reprocess_raw(records, sea_level_pressure=None):
+    """
+    Returns {'pressure', 'altitude', 'temperature', 'bar_in', 'pressure_altitude'} -> (timestamps, values)
+    for the MPL3115A2 records of a capture log, bar_in in the register's 2 Pa units.
+
+    'pressure_altitude' is recomputed from the barometer mode pressure samples. With
+    sea_level_pressure None each sample uses the calibration logged before it, pass a
+    value in Pa (scalar or one per pressure sample) to apply a corrected calibration.
+    """
+    pressure = select(records, RAW_MPL3115A2_PRESSURE)
+    altitude = select(records, RAW_MPL3115A2_ALTITUDE)
+    temperature = select(records, RAW_MPL3115A2_TEMPERATURE)
+    bar_in = select(records, RAW_MPL3115A2_BAR_IN)
+
+    t_data = temperature['data'].astype(np.int64)
+    bar_data = bar_in['data'].astype(np.int64)
+    bar_in_values = (bar_data[:, 0] << 8) | bar_data[:, 1]
+
+    pressure_values = pressure_batch(*_out_p(pressure))
+    if sea_level_pressure is None:
+        sea_level_pressure = sea_level_pressure_at(pressure['timestamp'], bar_in['timestamp'], bar_in_values)
+
+    return {
+        'pressure': (pressure['timestamp'], pressure_values),
+        'altitude': (altitude['timestamp'], altitude_batch(*_out_p(altitude))),
+        'temperature': (temperature['timestamp'], temperature_batch(t_data[:, 0], t_data[:, 1])),
+        'bar_in': (bar_in['timestamp'], bar_in_values),
+        'pressure_altitude': (pressure['timestamp'], pressure_to_altitude_batch(pressure_values, sea_level_pressure)),
+    }
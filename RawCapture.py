@@ -0,0 +1,98 @@
+import os
+import struct
+import threading
+import time
+import numpy as np
+
+# FILE HEADER
+RAW_LOG_MAGIC = b'WSRAW'
+RAW_LOG_VERSION = 1
+RAW_LOG_HEADER = struct.Struct('<5sB')
+
+# SENSOR / MEASUREMENT IDS
+RAW_TSL2591 = 0x01  # data: full lsb, full msb, ir lsb, ir msb
+RAW_SHT31D = 0x02  # data: temp msb, temp lsb, crc, hum msb, hum lsb, crc
+RAW_MPL3115A2_PRESSURE = 0x03  # data: out_p msb, csb, lsb
+RAW_MPL3115A2_ALTITUDE = 0x04  # data: out_p msb, csb, lsb
+RAW_MPL3115A2_TEMPERATURE = 0x05  # data: out_t msb, lsb
+RAW_MPL3115A2_BAR_IN = 0x06  # data: bar_in msb, lsb
+
+RAW_DATA_SIZE = 6
+
+# One fixed size record per read. "config" holds the register value that
+# decides how the counts are interpreted (TSL2591 control, MPL3115A2 CTRL_REG1).
+RAW_RECORD = struct.Struct('<dBB6s')
+RAW_RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('sensor', 'u1'),
+    ('config', 'u1'),
+    ('data', 'u1', (RAW_DATA_SIZE,)),
+])
+
+
+class RawCaptureLog(object):
+    _file = None
+    _lock = None
+
+    def __init__(self, path, buffer_size=64 * 1024):
+        """
+        :type path: string specifying the log file, appended to if it exists
+        :type buffer_size: int specifying the write buffer in bytes
+        """
+        self._lock = threading.Lock()
+        header = RAW_LOG_HEADER.pack(RAW_LOG_MAGIC, RAW_LOG_VERSION)
+        with open(path, 'ab+') as f:
+            f.seek(0)
+            existing = f.read(RAW_LOG_HEADER.size)
+        if not header.startswith(existing):
+            raise ValueError("{0} is not a raw capture log".format(path))
+
+        self._file = open(path, 'ab', buffer_size)
+        size = self._file.tell()
+        if size < RAW_LOG_HEADER.size:
+            # new file, or power was lost while the header was written
+            self._file.truncate(0)
+            self._file.write(header)
+        else:
+            # drop a record cut short by a power loss so appended records stay aligned
+            self._file.truncate(size - (size - RAW_LOG_HEADER.size) % RAW_RECORD.size)
+
+    def record(self, sensor, config, data, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        packed = RAW_RECORD.pack(timestamp, sensor, config & 0xFF, bytes(bytearray(data)))
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(packed)
+
+    def flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_raw_log(path):
+    """ Load a capture log as a structured array of RAW_RECORD_DTYPE """
+    with open(path, 'rb') as f:
+        header = f.read(RAW_LOG_HEADER.size)
+    if header != RAW_LOG_HEADER.pack(RAW_LOG_MAGIC, RAW_LOG_VERSION):
+        raise ValueError("{0} is not a raw capture log".format(path))
+
+    # drop a partially written trailing record
+    count = (os.path.getsize(path) - RAW_LOG_HEADER.size) // RAW_RECORD_DTYPE.itemsize
+    return np.fromfile(path, dtype=RAW_RECORD_DTYPE, count=count, offset=RAW_LOG_HEADER.size)
+
+
+def select(records, sensor):
+    return records[records['sensor'] == sensor]
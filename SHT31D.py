@@ -1,5 +1,7 @@
+import numpy as np
 import smbus
 import time
+from RawCapture import RAW_SHT31D, select
 
 # SHT31D default address.
 SHT31_I2CADDR = 0x44
@@ -31,10 +33,12 @@ class Sht31d(object):
     def __init__(
             self,
             i2c_bus=0,
-            sensor_address=SHT31_I2CADDR
+            sensor_address=SHT31_I2CADDR,
+            capture=None
     ):
         self.bus = smbus.SMBus(i2c_bus)
         self.sensor_address = sensor_address
+        self.capture = capture
 
     def poll(self):
         sta = 0
@@ -77,6 +81,8 @@ class Sht31d(object):
         self.write_command(SHT31_MEAS_HIGHREP)
         time.sleep(0.015)
         buffer = self.bus.read_i2c_block_data(self.sensor_address, 0, 6)
+        if self.capture is not None:
+            self.capture.record(RAW_SHT31D, 0, buffer)
 
         if buffer[2] != self.crc8(buffer[0:2]):
             return False, float("nan"), float("nan")
@@ -112,3 +118,41 @@ class Sht31d(object):
                 else:
                     crc = (crc << 1)
         return crc & 0xFF
+
+
+def _crc8_table():
+    table = np.zeros(256, dtype=np.uint8)
+    for value in range(256):
+        crc = value
+        for i in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ 0x31) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+        table[value] = crc
+    return table
+
+
+_CRC8_TABLE = _crc8_table()
+
+
+def crc8_batch(msb, lsb):
+    """ Vectorized Sht31d.crc8 over two byte words """
+    crc = _CRC8_TABLE[0xFF ^ np.asarray(msb, dtype=np.uint8)]
+    return _CRC8_TABLE[crc ^ np.asarray(lsb, dtype=np.uint8)]
+
+
+def reprocess_raw(records):
+    """ Returns timestamps, temperature, humidity for the SHT31D records of a capture log, nan on crc errors """
+    records = select(records, RAW_SHT31D)
+    data = records['data']
+
+    valid = (data[:, 2] == crc8_batch(data[:, 0], data[:, 1])) & \
+            (data[:, 5] == crc8_batch(data[:, 3], data[:, 4]))
+
+    raw_temperature = (data[:, 0].astype(np.float64) * 256) + data[:, 1]
+    raw_humidity = (data[:, 3].astype(np.float64) * 256) + data[:, 4]
+    temperature = np.where(valid, 175.0 * raw_temperature / 0xFFFF - 45.0, np.nan)
+    humidity = np.where(valid, 100.0 * raw_humidity / 0xFFFF, np.nan)
+
+    return records['timestamp'], temperature, humidity
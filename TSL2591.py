@@ -1,5 +1,7 @@
+import numpy as np
 import smbus
 import time
+from RawCapture import RAW_TSL2591, select
 
 VISIBLE = 2  # channel 0 - channel 1
 INFRARED = 1  # channel 1
@@ -53,10 +55,12 @@ class Tsl2591(object):
             i2c_bus=0,
             sensor_address=0x29,
             integration=INTEGRATIONTIME_100MS,
-            gain=GAIN_LOW
+            gain=GAIN_LOW,
+            capture=None
     ):
         self.bus = smbus.SMBus(i2c_bus)
         self.sendor_address = sensor_address
+        self.capture = capture
         self.integration_time = integration
         self.gain = gain
         self.set_timing(self.integration_time)
@@ -152,6 +156,12 @@ class Tsl2591(object):
             self.sendor_address, COMMAND_BIT | REGISTER_CHAN1_LOW
         )
         self.disable()
+        if self.capture is not None:
+            self.capture.record(
+                RAW_TSL2591,
+                self.integration_time | self.gain,
+                [full & 0xFF, full >> 8, ir & 0xFF, ir >> 8, 0, 0]
+            )
         return full, ir
 
     def get_luminosity(self, channel):
@@ -169,6 +179,45 @@ class Tsl2591(object):
             return 0
 
 
+def calculate_lux_batch(
+        full,
+        ir,
+        control,
+        lux_df=LUX_DF,
+        coefb=LUX_COEFB,
+        coefc=LUX_COEFC,
+        coefd=LUX_COEFD
+):
+    """ Vectorized Tsl2591.calculate_lux, control is integration | gain per sample """
+    full = np.asarray(full, dtype=np.float64)
+    ir = np.asarray(ir, dtype=np.float64)
+    control = np.asarray(control, dtype=np.uint8)
+
+    # indexed by the integration bits, unknown values fall back to 100ms
+    atime = np.array([100., 200., 300., 400., 500., 600., 100., 100.])[control & 0x07]
+    # indexed by the gain bits
+    again = np.array([1., 25., 428., 9876.])[(control & 0x30) >> 4]
+
+    cpl = (atime * again) / lux_df
+    lux1 = (full - (coefb * ir)) / cpl
+    lux2 = ((coefc * full) - (coefd * ir)) / cpl
+    lux = np.maximum(lux1, lux2)
+
+    # overflow reads as 0 like the scalar version
+    lux[(full == 0xFFFF) | (ir == 0xFFFF)] = 0
+    return lux
+
+
+def reprocess_raw(records, **coefficients):
+    """ Returns timestamps, lux, full, ir for the TSL2591 records of a capture log """
+    records = select(records, RAW_TSL2591)
+    data = records['data'].astype(np.uint16)
+    full = data[:, 0] | (data[:, 1] << 8)
+    ir = data[:, 2] | (data[:, 3] << 8)
+    lux = calculate_lux_batch(full, ir, records['config'], **coefficients)
+    return records['timestamp'], lux, full, ir
+
+
 if __name__ == '__main__':
 
     tsl = Tsl2591()  # initialize
@@ -0,0 +1,292 @@
+#!/usr/bin/python
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from queue import Empty
+from MPL3115A2 import Mpl3115a2
+from TSL2591 import Tsl2591
+from SHT31D import Sht31d
+from RawCapture import RawCaptureLog
+from HttpExporter import HttpExporter, SnapshotCache
+
+# Example config:
+# {
+#     "stations": [
+#         {"name": "roof", "i2c_bus": 1, "mpl3115a2": "0x60", "tsl2591": "0x29", "sht31d": "0x44"},
+#         {"name": "garden", "i2c_bus": 3, "sht31d": "0x45"}
+#     ]
+# }
+SENSORS = ('mpl3115a2', 'tsl2591', 'sht31d')
+
+
+def load_config(path):
+    with open(path) as f:
+        config = json.load(f)
+
+    stations = []
+    for index, entry in enumerate(config['stations']):
+        station = {
+            'name': entry.get('name', 'station{0}'.format(index)),
+            'i2c_bus': int(entry.get('i2c_bus', 0)),
+        }
+        for sensor in SENSORS:
+            address = entry.get(sensor)
+            # addresses may be written as ints or hex strings
+            if isinstance(address, str):
+                address = int(address, 0)
+            station[sensor] = address
+        stations.append(station)
+
+    names = [station['name'] for station in stations]
+    if len(set(names)) != len(names):
+        raise ValueError("station names must be unique")
+
+    return stations
+
+
+class Station(object):
+    def __init__(self, config, capture_dir=None):
+        """
+        :type config: dict from load_config
+        :type capture_dir: string specifying where to append this station's raw capture log, or None
+        """
+        self.name = config['name']
+        self.tw = None
+        self.lw = None
+        self.hw = None
+        self.capture = None
+
+        capture = None
+        if capture_dir is not None:
+            # one log per station, records carry no device address
+            capture = self.capture = RawCaptureLog(os.path.join(capture_dir, '{0}.raw'.format(self.name)))
+
+        if config['mpl3115a2'] is not None:
+            self.tw = Mpl3115a2(config['i2c_bus'], sensor_address=config['mpl3115a2'], capture=capture)
+        if config['tsl2591'] is not None:
+            self.lw = Tsl2591(config['i2c_bus'], sensor_address=config['tsl2591'], capture=capture)
+        if config['sht31d'] is not None:
+            self.hw = Sht31d(config['i2c_bus'], sensor_address=config['sht31d'], capture=capture)
+
+    def calibrate(self):
+        if self.tw is not None:
+            self.tw.calibrate()
+
+    def flush(self):
+        if self.capture is not None:
+            self.capture.flush()
+
+    def close(self):
+        if self.capture is not None:
+            self.capture.close()
+
+    def sample(self):
+        readings = {}
+        hum_temp = None
+
+        if self.hw is not None:
+            success, hum_temp, hum = self.hw.read_temperature_humidity()
+            if success:
+                readings['hum'] = hum
+            else:
+                hum_temp = None
+
+        if self.tw is not None:
+            readings['tempC'] = self.tw.get_temperature()  # temp in Celsius
+            readings['pressure'] = (self.tw.get_pressure() / 1000)  # get pressure and convert to kPa
+        elif hum_temp is not None:
+            readings['tempC'] = hum_temp
+
+        if 'tempC' in readings:
+            readings['tempF'] = (readings['tempC'] * 1.8) + 32  # convert Celsius to Fahrenheit
+
+        if self.lw is not None:
+            full, ir = self.lw.get_full_luminosity()  # read raw values (full spectrum and ir spectrum)
+            readings['lux'] = self.lw.calculate_lux(full, ir)  # convert raw values to lux
+
+        return readings
+
+
+def bus_worker(i2c_bus, configs, period, queue, capture_dir=None):
+    """ Samples every station on one bus, one process per bus """
+    stations = []
+    try:
+        try:
+            for config in configs:
+                stations.append(Station(config, capture_dir))
+            for station in stations:
+                station.calibrate()
+        except (OSError, SystemExit) as err:
+            # Mpl3115a2 exits when its WHOAMI check fails
+            print("Bus {0} setup failed: {1!r}".format(i2c_bus, err))
+            sys.exit(1)
+
+        tick = int(time.time() // period) + 1
+        while True:
+            # wake on the shared tick boundary so every bus samples together
+            delay = tick * period - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+            for station in stations:
+                try:
+                    queue.put((tick, station.name, station.sample()))
+                except OSError as err:
+                    print("Bus {0} {1} OS Error: {2}".format(i2c_bus, station.name, err))
+                station.flush()
+
+            # a bus slower than the period skips ticks instead of falling behind
+            tick = max(tick + 1, int(time.time() // period) + 1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for station in stations:
+            station.close()
+
+
+class StreamMerger(object):
+    def __init__(self, names, period, max_lag=2):
+        """
+        :type names: list of station names expected every tick
+        :type period: float specifying sample period in seconds
+        :type max_lag: int specifying ticks to wait for a late station
+        """
+        self.names = set(names)
+        self.period = period
+        self.max_lag = max_lag
+        self._pending = {}
+        self._newest = None
+        self._emitted = None
+
+    def add(self, tick, name, readings):
+        """ Returns the merged rows that became complete, oldest first """
+        if self._emitted is not None and tick <= self._emitted:
+            return []  # arrived after its tick was emitted
+
+        self._pending.setdefault(tick, {})[name] = readings
+        if self._newest is None or tick > self._newest:
+            self._newest = tick
+
+        return self._ready()
+
+    def remove(self, names):
+        """ Stops waiting for stations that will not report again, returns rows that became complete """
+        self.names.difference_update(names)
+        return self._ready()
+
+    def _ready(self):
+        rows = []
+        for pending in sorted(self._pending):
+            stations = self._pending[pending]
+            if not self.names.issubset(stations) and pending > self._newest - self.max_lag:
+                break
+            rows.append((pending * self.period, self._pending.pop(pending)))
+            self._emitted = pending
+        return rows
+
+
+class Throughput(object):
+    def __init__(self, names):
+        self._counts = dict((name, 0) for name in names)
+        self._since = time.time()
+
+    def add(self, name):
+        self._counts[name] += 1
+
+    def report(self):
+        """ Returns samples per second for each station since the last report """
+        now = time.time()
+        elapsed = max(now - self._since, 1e-9)
+        rates = dict((name, count / elapsed) for name, count in self._counts.items())
+        self._counts = dict((name, 0) for name in self._counts)
+        self._since = now
+        return rates
+
+
+def format_row(timestamp, stations):
+    row = {'timestamp': timestamp, 'stations': stations}
+    return json.dumps(row, sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config', help='json file describing the stations')
+    parser.add_argument('--period', type=float, default=5., help='sample period in seconds')
+    parser.add_argument('--report-interval', type=float, default=60., help='seconds between throughput reports')
+    parser.add_argument('--capture-dir', help='append raw sensor reads to one capture log per station here')
+    parser.add_argument('--http-port', type=int, help='serve the merged readings over http on this port')
+    parser.add_argument('--http-host', default='127.0.0.1', help='address the http server binds to')
+    args = parser.parse_args()
+
+    stations = load_config(args.config)
+    buses = {}
+    for station in stations:
+        buses.setdefault(station['i2c_bus'], []).append(station)
+
+    queue = multiprocessing.Queue()
+    workers = {}
+    for i2c_bus, configs in sorted(buses.items()):
+        worker = multiprocessing.Process(
+            target=bus_worker,
+            args=(i2c_bus, configs, args.period, queue, args.capture_dir),
+            name='bus{0}'.format(i2c_bus))
+        worker.daemon = True
+        worker.start()
+        workers[i2c_bus] = worker
+
+    names = [station['name'] for station in stations]
+    merger = StreamMerger(names, args.period)
+    throughput = Throughput(names)
+    next_report = time.time() + args.report_interval
+
+    cache = None
+    if args.http_port:
+        cache = SnapshotCache()
+        HttpExporter(cache, host=args.http_host, port=args.http_port).start()
+
+    def emit(rows):
+        for timestamp, merged in rows:
+            print(format_row(timestamp, merged))
+            if cache is not None:
+                cache.update(merged, timestamp)
+
+    try:
+        while True:
+            try:
+                tick, name, readings = queue.get(timeout=args.period)
+            except Empty:
+                tick = None
+
+            if tick is not None:
+                throughput.add(name)
+                emit(merger.add(tick, name, readings))
+
+            for i2c_bus, worker in list(workers.items()):
+                if not worker.is_alive():
+                    # a dead bus never answers again, stop holding rows back for it
+                    del workers[i2c_bus]
+                    dead = [config['name'] for config in buses[i2c_bus]]
+                    print("Bus {0} worker exited with code {1}, dropping {2}".format(
+                        i2c_bus, worker.exitcode, ', '.join(dead)))
+                    emit(merger.remove(dead))
+
+            if time.time() >= next_report:
+                for station_name, rate in sorted(throughput.report().items()):
+                    print("Throughput {0}: {1:.2f} samples/s".format(station_name, rate))
+                next_report = time.time() + args.report_interval
+
+            if not workers:
+                print("All bus workers exited")
+                return 1
+    except KeyboardInterrupt:
+        print("Keyboard Interrupt detected")
+        for worker in workers.values():
+            worker.join(1)
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
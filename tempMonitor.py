@@ -1,4 +1,5 @@
 #!/usr/bin/python
+import argparse
 import sys
 import threading
 import time
@@ -6,10 +7,12 @@ from MPL3115A2 import Mpl3115a2
 from SSD1306 import Ssd1306
 from TSL2591 import Tsl2591
 from SHT31D import Sht31d
+from RawCapture import RawCaptureLog
+from HttpExporter import HttpExporter, SnapshotCache
 
 
 class GetSensorReadingsThread(threading.Thread):
-    def __init__(self, mpl3115a2, tsl2591, sht31d):
+    def __init__(self, mpl3115a2, tsl2591, sht31d, snapshot_cache=None, capture_log=None):
         self.tempC = 0
         self.tempF = 0
         self.pressure = 0
@@ -18,6 +21,8 @@ class GetSensorReadingsThread(threading.Thread):
         self.tw = mpl3115a2
         self.lw = tsl2591
         self.hw = sht31d
+        self.cache = snapshot_cache
+        self.capture = capture_log
         super(GetSensorReadingsThread, self).__init__()
 
     def run(self):
@@ -26,18 +31,39 @@ class GetSensorReadingsThread(threading.Thread):
         self.pressure = (self.tw.get_pressure() / 1000)  # get pressure and convert to kPa
         full, ir = self.lw.get_full_luminosity()  # read raw values (full spectrum and ir spectrum)
         self.lux = self.lw.calculate_lux(full, ir)  # convert raw values to lux
-        self.hum = self.hw.read_humidity()  # get humidity
+        success, _temp, hum = self.hw.read_temperature_humidity()  # get humidity
+        self.hum = hum if success else 0  # the display keeps the last non-zero value
+        if self.cache is not None:
+            self.cache.update({'local': {
+                'tempC': self.tempC,
+                'tempF': self.tempF,
+                'pressure': self.pressure,
+                'lux': self.lux,
+                'hum': hum if success else None,  # failed crc is served as null
+            }})
+        if self.capture is not None:
+            self.capture.flush()  # keep the raw history on disk every cycle
         time.sleep(1)
 
+# Arguments
+parser = argparse.ArgumentParser()
+parser.add_argument('--capture', help='append raw sensor reads to this capture log')
+parser.add_argument('--http-port', type=int, help='serve the latest readings over http on this port')
+parser.add_argument('--http-host', default='127.0.0.1', help='address the http server binds to')
+args = parser.parse_args()
+
 # Globals
 textToWrite = ''
 # Special characters
 deg = u'\N{DEGREE SIGN}'
 
+_capture_log = RawCaptureLog(args.capture) if args.capture else None  # Raw Capture Log
+_snapshot_cache = SnapshotCache() if args.http_port else None  # Readings served over http
+
 _display_wrapper = Ssd1306()  # Display Wrapper
-_temp_and_press_wrapper = Mpl3115a2()  # Temperature/Pressure Wrapper
-_luminosity_wrapper = Tsl2591()  # Luminosity Wrapper
-_humidity_wrapper = Sht31d()  # Humidity Wrapper
+_temp_and_press_wrapper = Mpl3115a2(capture=_capture_log)  # Temperature/Pressure Wrapper
+_luminosity_wrapper = Tsl2591(capture=_capture_log)  # Luminosity Wrapper
+_humidity_wrapper = Sht31d(capture=_capture_log)  # Humidity Wrapper
 
 try:
     # Draw a black filled box to clear the image.
@@ -59,6 +85,9 @@ try:
 
     _temp_and_press_wrapper.calibrate()
 
+    if _snapshot_cache is not None:
+        HttpExporter(_snapshot_cache, host=args.http_host, port=args.http_port).start()
+
     #display related vars
     # i = 0
     x_max = _display_wrapper.width
@@ -80,8 +109,10 @@ try:
         if x <= (-1 * (text_width + x_max)):
             x = x_max
 
-        if thread_count == 1:
-            sensor_thread = GetSensorReadingsThread(_temp_and_press_wrapper, _luminosity_wrapper, _humidity_wrapper)
+        # track the sampler itself, the http exporter keeps its own thread alive
+        if sensor_thread is None or not sensor_thread.is_alive():
+            sensor_thread = GetSensorReadingsThread(
+                _temp_and_press_wrapper, _luminosity_wrapper, _humidity_wrapper, _snapshot_cache, _capture_log)
             sensor_thread.start()
 
         if sensor_thread is not None:
@@ -144,3 +175,6 @@ except KeyboardInterrupt:
     _display_wrapper.clear_display()
     _display_wrapper.display_image()
     sys.exit(0);
+finally:
+    if _capture_log is not None:
+        _capture_log.close()
@@ -0,0 +1,96 @@
+import http.client
+import json
+import socket
+
+import pytest
+
+from HttpExporter import HttpExporter, SnapshotCache
+
+
+def test_snapshot_cache_renders_json_and_prometheus():
+    cache = SnapshotCache(history_size=2)
+    cache.update({'roof': {'tempC': 20.5, 'hum': 40.}}, timestamp=1.)
+    cache.update({'roof': {'tempC': 21.5, 'hum': float('nan')}, 'shed': {'lux': 3}}, timestamp=2.)
+    cache.update({'roof': {'tempC': 22.5}}, timestamp=3.)
+
+    content_type, body = cache.body('/readings')
+    assert content_type == 'application/json'
+    assert json.loads(body) == {'timestamp': 3., 'stations': {'roof': {'tempC': 22.5}}}
+
+    # strict parsing, nan became null
+    history = json.loads(cache.body('/history')[1], parse_constant=pytest.fail)
+    assert [entry['timestamp'] for entry in history] == [2., 3.]
+    assert history[0]['stations']['roof']['hum'] is None
+
+    cache.update({'roof': {'tempC': 21., 'hum': float('nan')}}, timestamp=4.)
+    metrics = cache.body('/metrics')[1].decode('utf-8').splitlines()
+    assert 'weather_temperature_celsius{station="roof"} 21.0' in metrics
+    assert '# TYPE weather_temperature_celsius gauge' in metrics
+    assert 'weather_last_update_timestamp_seconds 4.0' in metrics
+    assert not [line for line in metrics if 'humidity' in line]
+
+
+def test_snapshot_cache_before_first_update():
+    cache = SnapshotCache()
+
+    assert json.loads(cache.body('/readings')[1]) == {'timestamp': None, 'stations': {}}
+    assert cache.body('/metrics')[1] == b''
+    assert cache.body('/nope') is None
+
+
+@pytest.fixture
+def exporter():
+    cache = SnapshotCache()
+    cache.update({'roof': {'tempC': 20.}}, timestamp=1.)
+    server = HttpExporter(cache, port=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_http_round_trip_on_one_connection(exporter):
+    connection = http.client.HTTPConnection('127.0.0.1', exporter.port, timeout=5)
+
+    connection.request('GET', '/readings')
+    response = connection.getresponse()
+    assert response.status == 200
+    assert response.getheader('Connection') == 'keep-alive'
+    assert json.loads(response.read())['stations'] == {'roof': {'tempC': 20.}}
+
+    # the same connection answers the next requests
+    connection.request('HEAD', '/metrics')
+    response = connection.getresponse()
+    assert response.status == 200
+    assert int(response.getheader('Content-Length')) == len(exporter.cache.body('/metrics')[1])
+    assert response.read() == b''
+
+    connection.request('GET', '/missing')
+    response = connection.getresponse()
+    assert response.status == 404
+    response.read()
+
+    connection.request('GET', '/metrics', headers={'Connection': 'close'})
+    response = connection.getresponse()
+    assert response.status == 200
+    assert response.getheader('Connection') == 'close'
+    assert b'weather_temperature_celsius{station="roof"} 20.0' in response.read()
+    connection.close()
+
+
+def test_http_request_body_is_not_parsed_as_a_request(exporter):
+    smuggled = b'GET /x HTTP/1.1\r\n\r\n'
+    request = b'POST /metrics HTTP/1.1\r\nHost: localhost\r\nContent-Length: ' + \
+        str(len(smuggled)).encode('ascii') + b'\r\n\r\n' + smuggled
+
+    with socket.create_connection(('127.0.0.1', exporter.port), timeout=5) as sock:
+        sock.sendall(request)
+        received = b''
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            received += chunk
+
+    assert received.startswith(b'HTTP/1.1 405 ')
+    assert b'Connection: close' in received
+    assert received.count(b'HTTP/1.1 ') == 1
@@ -0,0 +1,221 @@
+import random
+
+import numpy as np
+import pytest
+
+import MPL3115A2
+import SHT31D
+import TSL2591
+from RawCapture import RawCaptureLog, read_raw_log, RAW_RECORD_DTYPE, RAW_LOG_HEADER, RAW_LOG_MAGIC, \
+    RAW_LOG_VERSION, RAW_TSL2591
+
+
+class FakeBus(object):
+    """ Stands in for SMBus, block reads come from a list of canned buffers """
+
+    def __init__(self, blocks=None):
+        self.blocks = list(blocks or [])
+
+    def read_byte_data(self, address, register):
+        return 0xFF  # every status bit ready
+
+    def write_byte_data(self, address, register, value):
+        pass
+
+    def write_i2c_block_data(self, address, register, data):
+        pass
+
+    def read_i2c_block_data(self, address, register, length):
+        return self.blocks.pop(0)[:length]
+
+
+def make_mpl(bus, capture):
+    mpl = MPL3115A2.Mpl3115a2.__new__(MPL3115A2.Mpl3115a2)
+    mpl._bus = bus
+    mpl._capture = capture
+    return mpl
+
+
+def make_sht(bus, capture):
+    sht = SHT31D.Sht31d.__new__(SHT31D.Sht31d)
+    sht.bus = bus
+    sht.sensor_address = SHT31D.SHT31_I2CADDR
+    sht.capture = capture
+    return sht
+
+
+def random_bytes(rng, count):
+    return [rng.randint(0, 255) for _ in range(count)]
+
+
+def test_capture_round_trip(tmp_path):
+    path = str(tmp_path / 'capture.raw')
+    with RawCaptureLog(path) as log:
+        log.record(RAW_TSL2591, 0x13, [1, 2, 3, 4, 0, 0], timestamp=10.5)
+    # reopening appends without a second header
+    with RawCaptureLog(path) as log:
+        log.record(RAW_TSL2591, 0x20, [5, 6, 7, 8, 0, 0], timestamp=11.5)
+
+    records = read_raw_log(path)
+    assert records.dtype == RAW_RECORD_DTYPE
+    assert list(records['timestamp']) == [10.5, 11.5]
+    assert list(records['config']) == [0x13, 0x20]
+    assert records['data'].tolist() == [[1, 2, 3, 4, 0, 0], [5, 6, 7, 8, 0, 0]]
+
+
+def test_read_raw_log_drops_partial_record(tmp_path):
+    path = str(tmp_path / 'capture.raw')
+    with RawCaptureLog(path) as log:
+        log.record(RAW_TSL2591, 0, [0] * 6, timestamp=1.)
+    with open(path, 'ab') as f:
+        f.write(b'\x00' * 5)
+
+    assert len(read_raw_log(path)) == 1
+
+
+def test_reopen_after_partial_write_stays_aligned(tmp_path):
+    path = str(tmp_path / 'capture.raw')
+    with RawCaptureLog(path) as log:
+        log.record(RAW_TSL2591, 0x01, [1, 2, 3, 4, 0, 0], timestamp=1.)
+    with open(path, 'ab') as f:
+        f.write(b'\x00' * 5)  # power lost mid record
+
+    with RawCaptureLog(path) as log:
+        log.record(RAW_TSL2591, 0x02, [5, 6, 7, 8, 0, 0], timestamp=2.)
+
+    records = read_raw_log(path)
+    assert list(records['timestamp']) == [1., 2.]
+    assert records['data'].tolist() == [[1, 2, 3, 4, 0, 0], [5, 6, 7, 8, 0, 0]]
+
+
+def test_reopen_after_partial_header(tmp_path):
+    path = tmp_path / 'capture.raw'
+    path.write_bytes(RAW_LOG_HEADER.pack(RAW_LOG_MAGIC, RAW_LOG_VERSION)[:3])
+
+    with RawCaptureLog(str(path)) as log:
+        log.record(RAW_TSL2591, 0, [0] * 6, timestamp=1.)
+
+    assert list(read_raw_log(str(path))['timestamp']) == [1.]
+
+
+def test_capture_log_refuses_other_files(tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_bytes(b'keep me')
+
+    with pytest.raises(ValueError):
+        RawCaptureLog(str(path))
+    assert path.read_bytes() == b'keep me'
+
+
+def test_read_raw_log_rejects_short_files(tmp_path):
+    path = tmp_path / 'short.raw'
+    path.write_bytes(RAW_LOG_MAGIC[:2])
+
+    with pytest.raises(ValueError):
+        read_raw_log(str(path))
+
+
+def test_read_raw_log_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.raw'
+    path.write_bytes(b'\x00' * (RAW_LOG_HEADER.size + RAW_RECORD_DTYPE.itemsize))
+
+    with pytest.raises(ValueError):
+        read_raw_log(str(path))
+
+
+def test_calculate_lux_batch_matches_scalar():
+    rng = random.Random(26)
+    tsl = TSL2591.Tsl2591.__new__(TSL2591.Tsl2591)
+    full, ir, control, expected = [], [], [], []
+
+    for integration in range(6):
+        for gain in (TSL2591.GAIN_LOW, TSL2591.GAIN_MED, TSL2591.GAIN_HIGH, TSL2591.GAIN_MAX):
+            tsl.integration_time = integration
+            tsl.gain = gain
+            for f, i in [(0xFFFF, 10), (10, 0xFFFF)] + [(rng.randint(0, 0xFFFF), rng.randint(0, 0xFFFF))
+                                                         for _ in range(50)]:
+                full.append(f)
+                ir.append(i)
+                control.append(integration | gain)
+                expected.append(tsl.calculate_lux(f, i))
+
+    assert np.allclose(TSL2591.calculate_lux_batch(full, ir, control), expected)
+
+
+def test_tsl2591_reprocess_raw_with_new_coefficient(tmp_path):
+    path = str(tmp_path / 'capture.raw')
+    with RawCaptureLog(path) as log:
+        log.record(RAW_TSL2591, TSL2591.INTEGRATIONTIME_200MS | TSL2591.GAIN_MED, [0x34, 0x12, 0x21, 0x03, 0, 0])
+
+    timestamps, lux, full, ir = TSL2591.reprocess_raw(read_raw_log(path), lux_df=2 * TSL2591.LUX_DF)
+    assert list(full) == [0x1234] and list(ir) == [0x0321]
+
+    tsl = TSL2591.Tsl2591.__new__(TSL2591.Tsl2591)
+    tsl.integration_time = TSL2591.INTEGRATIONTIME_200MS
+    tsl.gain = TSL2591.GAIN_MED
+    assert np.allclose(lux, 2 * tsl.calculate_lux(0x1234, 0x0321))
+
+
+def test_crc8_batch_matches_scalar():
+    sht = make_sht(None, None)
+    msb, lsb = np.meshgrid(np.arange(256), np.arange(0, 256, 7))
+    expected = [sht.crc8([m, l]) for m, l in zip(msb.ravel(), lsb.ravel())]
+
+    assert list(SHT31D.crc8_batch(msb.ravel(), lsb.ravel())) == expected
+
+
+def test_sht31d_reprocess_raw_matches_driver(tmp_path, monkeypatch):
+    monkeypatch.setattr(SHT31D.time, 'sleep', lambda seconds: None)
+    rng = random.Random(31)
+    sht = make_sht(FakeBus(), None)
+    for index in range(200):
+        block = random_bytes(rng, 6)
+        if index % 4:
+            block[2] = sht.crc8(block[0:2])
+            block[5] = sht.crc8(block[3:5])
+        sht.bus.blocks.append(block)
+
+    path = str(tmp_path / 'capture.raw')
+    with RawCaptureLog(path) as log:
+        sht.capture = log
+        expected = [sht.read_temperature_humidity() for _ in range(200)]
+
+    timestamps, temperature, humidity = SHT31D.reprocess_raw(read_raw_log(path))
+    assert np.allclose(temperature, [t for s, t, h in expected], equal_nan=True)
+    assert np.allclose(humidity, [h for s, t, h in expected], equal_nan=True)
+    assert np.isnan(temperature).sum() == sum(1 for s, t, h in expected if not s)
+
+
+def test_mpl3115a2_reprocess_raw_matches_driver(tmp_path):
+    rng = random.Random(3115)
+    mpl = make_mpl(FakeBus([random_bytes(rng, 3) for _ in range(300)]), None)
+
+    path = str(tmp_path / 'capture.raw')
+    with RawCaptureLog(path) as log:
+        mpl._capture = log
+        pressure, altitude, temperature = [], [], []
+        for _ in range(100):
+            pressure.append(mpl.get_pressure())
+            altitude.append(mpl.get_altitude())
+            temperature.append(mpl.get_temperature())
+
+    reprocessed = MPL3115A2.reprocess_raw(read_raw_log(path))
+    assert np.allclose(reprocessed['pressure'][1], pressure)
+    assert np.allclose(reprocessed['altitude'][1], altitude)
+    assert np.allclose(reprocessed['temperature'][1], temperature)
+
+
+def test_mpl3115a2_pressure_altitude_follows_calibration(tmp_path):
+    path = str(tmp_path / 'capture.raw')
+    pressure = [0x61, 0xA8, 0x00]  # 100000 Pa
+    with RawCaptureLog(path) as log:
+        log.record(MPL3115A2.RAW_MPL3115A2_PRESSURE, 0, pressure + [0, 0, 0], timestamp=1.)
+        log.record(MPL3115A2.RAW_MPL3115A2_BAR_IN, 0, [0xC3, 0x50, 0, 0, 0, 0], timestamp=2.)  # 2 * 50000 Pa
+        log.record(MPL3115A2.RAW_MPL3115A2_PRESSURE, 0, pressure + [0, 0, 0], timestamp=3.)
+    records = read_raw_log(path)
+
+    timestamps, altitude = MPL3115A2.reprocess_raw(records)['pressure_altitude']
+    assert np.allclose(altitude, [MPL3115A2.pressure_to_altitude_batch(100000.), 0.])
+
+    timestamps, altitude = MPL3115A2.reprocess_raw(records, sea_level_pressure=100000.)['pressure_altitude']
+    assert np.allclose(altitude, [0., 0.])
@@ -0,0 +1,105 @@
+import json
+
+import numpy as np
+
+import MPL3115A2
+import SHT31D
+from RawCapture import read_raw_log
+from stationManager import Station, StreamMerger, load_config
+
+
+def test_merger_emits_complete_ticks_in_order():
+    merger = StreamMerger(['roof', 'garden'], period=5.)
+
+    assert merger.add(2, 'roof', {'lux': 2}) == []
+    assert merger.add(1, 'roof', {'lux': 1}) == []
+    # tick 2 is complete but must wait for tick 1
+    assert merger.add(2, 'garden', {'hum': 2}) == []
+    assert merger.add(1, 'garden', {'hum': 1}) == [
+        (5., {'roof': {'lux': 1}, 'garden': {'hum': 1}}),
+        (10., {'roof': {'lux': 2}, 'garden': {'hum': 2}}),
+    ]
+
+
+def test_merger_gives_up_on_late_station_and_drops_its_sample():
+    merger = StreamMerger(['roof', 'garden'], period=1., max_lag=2)
+
+    assert merger.add(1, 'roof', {}) == []
+    assert merger.add(2, 'roof', {}) == []
+    assert merger.add(3, 'roof', {}) == [(1., {'roof': {}})]
+
+    # garden's tick 1 already went out without it
+    assert merger.add(1, 'garden', {}) == []
+    assert merger.add(2, 'garden', {}) == [(2., {'roof': {}, 'garden': {}})]
+
+
+def test_merger_remove_releases_waiting_rows():
+    merger = StreamMerger(['roof', 'garden'], period=1.)
+
+    assert merger.add(1, 'roof', {'lux': 1}) == []
+    assert merger.remove(['garden']) == [(1., {'roof': {'lux': 1}})]
+    assert merger.add(2, 'roof', {'lux': 2}) == [(2., {'roof': {'lux': 2}})]
+
+
+def test_load_config_parses_addresses(tmp_path):
+    path = tmp_path / 'stations.json'
+    path.write_text(json.dumps({'stations': [
+        {'name': 'roof', 'i2c_bus': 1, 'mpl3115a2': '0x60', 'sht31d': 68},
+    ]}))
+
+    station, = load_config(str(path))
+    assert station == {'name': 'roof', 'i2c_bus': 1, 'mpl3115a2': 0x60, 'tsl2591': None, 'sht31d': 0x44}
+
+
+class AddressedBus(object):
+    """ Stands in for SMBus, answers block reads from a per-address buffer """
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+
+    def read_byte_data(self, address, register):
+        return 0xC4 if register == MPL3115A2.MPL3115A2_WHOAMI else 0xFF
+
+    def write_byte_data(self, address, register, value):
+        pass
+
+    def write_i2c_block_data(self, address, register, data):
+        pass
+
+    def read_i2c_block_data(self, address, register, length):
+        return self.blocks[address][:length]
+
+
+def test_stations_sharing_a_bus_capture_separately(tmp_path, monkeypatch):
+    sht = SHT31D.Sht31d.__new__(SHT31D.Sht31d)
+    blocks = {}
+    for address, msb in ((0x44, 0x40), (0x45, 0x80)):
+        block = [msb, 0x00, 0, msb, 0x00, 0]
+        block[2] = block[5] = sht.crc8(block[0:2])
+        blocks[address] = block
+    blocks[0x60] = [0x61, 0xA8, 0x00]
+    blocks[0x61] = [0x62, 0x00, 0x00]
+
+    bus = AddressedBus(blocks)
+    monkeypatch.setattr(SHT31D.smbus, 'SMBus', lambda i2c_bus: bus)
+    monkeypatch.setattr(MPL3115A2, 'SMBus', lambda i2c_bus: bus)
+    monkeypatch.setattr(SHT31D.time, 'sleep', lambda seconds: None)
+
+    stations = [
+        Station({'name': 'roof', 'i2c_bus': 1, 'mpl3115a2': 0x60, 'tsl2591': None, 'sht31d': 0x44}, str(tmp_path)),
+        Station({'name': 'shed', 'i2c_bus': 1, 'mpl3115a2': 0x61, 'tsl2591': None, 'sht31d': 0x45}, str(tmp_path)),
+    ]
+    expected = {}
+    for station in stations:
+        station.calibrate()
+        expected[station.name] = station.sample()
+        station.close()
+
+    for name in ('roof', 'shed'):
+        records = read_raw_log(str(tmp_path / '{0}.raw'.format(name)))
+        timestamps, temperature, humidity = SHT31D.reprocess_raw(records)
+        assert np.allclose(humidity, [expected[name]['hum']])
+
+        reprocessed = MPL3115A2.reprocess_raw(records)
+        assert np.allclose(reprocessed['pressure'][1][-1], expected[name]['pressure'] * 1000)
+        assert len(reprocessed['bar_in'][1]) == 1